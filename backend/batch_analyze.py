@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Batch menu analysis for venue onboarding.
+
+Analyzes every menu image in a directory or tarball and stores the results
+in MongoDB. Completed image hashes are appended to a checkpoint file, so an
+interrupted run can be restarted with the same command and will pick up
+where it left off.
+
+Usage:
+    python batch_analyze.py menus/ [--concurrency 8] [--checkpoint menus.ckpt] [--report report.json]
+    python batch_analyze.py menus.tar.gz
+"""
+
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import sys
+import tarfile
+
+from server import analyze_menu_batch, create_indexes, BATCH_LLM_CONCURRENCY
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".heic"}
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+def directory_items(path):
+    """Yield (name, content_type, load) for each image below a directory"""
+    for root, _, files in os.walk(path):
+        for filename in sorted(files):
+            if not is_image(filename):
+                continue
+            file_path = os.path.join(root, filename)
+
+            async def load(file_path=file_path):
+                loop = asyncio.get_running_loop()
+                with open(file_path, "rb") as f:
+                    return await loop.run_in_executor(None, f.read)
+
+            yield os.path.relpath(file_path, path), mimetypes.guess_type(filename)[0], load
+
+def tarball_items(archive):
+    """Yield (name, content_type, load) for each image in an open tarball"""
+    for member in archive.getmembers():
+        if not member.isfile() or not is_image(member.name):
+            continue
+
+        # tarfile is not thread-safe, so members are read on the event loop
+        async def load(member=member):
+            return archive.extractfile(member).read()
+
+        yield member.name, mimetypes.guess_type(member.name)[0], load
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+async def run(args):
+    if os.path.isdir(args.source):
+        archive = None
+        items = list(directory_items(args.source))
+    elif os.path.isfile(args.source) and tarfile.is_tarfile(args.source):
+        archive = tarfile.open(args.source)
+        items = list(tarball_items(archive))
+    else:
+        print(f"❌ {args.source} is neither a directory nor a tarball")
+        return 1
+
+    completed = read_checkpoint(args.checkpoint)
+    if completed:
+        print(f"🔁 Resuming: {len(completed)} images already completed")
+
+    checkpoint = open(args.checkpoint, "a")
+
+    def on_stored(hashes):
+        checkpoint.write("".join(f"{h}\n" for h in hashes))
+        checkpoint.flush()
+
+    try:
+        print(f"📦 Found {len(items)} menu images in {args.source}")
+        await create_indexes()
+        summary = await analyze_menu_batch(
+            items,
+            concurrency=args.concurrency,
+            skip_hashes=completed,
+            on_stored=on_stored
+        )
+    finally:
+        checkpoint.close()
+        if archive is not None:
+            archive.close()
+
+    print(f"\n📊 Analyzed: {summary['analyzed']}  Skipped: {summary['skipped']}  Failed: {summary['failed']}")
+    for result in summary["results"]:
+        if result["status"] == "failed":
+            print(f"  ❌ {result['filename']}: {result['error']}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"📝 Report written to {args.report}")
+
+    return 1 if summary["failed"] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a directory or tarball of menu images")
+    parser.add_argument("source", help="directory or tarball of menu images")
+    parser.add_argument("--concurrency", type=positive_int, default=BATCH_LLM_CONCURRENCY,
+                        help="maximum concurrent LLM calls")
+    parser.add_argument("--checkpoint", help="file of completed image hashes (default: <source>.checkpoint)")
+    parser.add_argument("--report", help="write the per-item report as JSON to this file")
+    args = parser.parse_args()
+    args.checkpoint = args.checkpoint or os.path.normpath(args.source) + ".checkpoint"
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Circuit breaker for upstream LLM calls.
+
+After `failure_threshold` consecutive upstream failures (timeouts, connection
+errors, 408/429 or 5xx responses; see is_upstream_failure) the breaker opens
+and rejects calls immediately with CircuitOpenError. Once `reset_timeout`
+seconds have passed it lets a single probe call through (half-open): success
+closes the breaker, failure opens it again. Results of calls that started
+before a trip do not change the state.
+"""
+
+import asyncio
+import time
+
+# 4xx statuses that mean upstream is overloaded rather than the request being bad
+UPSTREAM_FAILURE_STATUSES = (408, 429)
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    True for errors that say upstream is unhealthy: timeouts, connection
+    errors, rate limiting (429), request timeouts (408) and 5xx responses.
+    Anything else (bad input, other 4xx) is the caller's problem and must not
+    trip the breaker for everyone.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status_code, int) and (status_code >= 500 or status_code in UPSTREAM_FAILURE_STATUSES)
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling upstream while the breaker is open
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock=time.monotonic, is_failure=is_upstream_failure):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._is_failure = is_failure
+
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._probe_in_flight = False
+        # Bumped on every trip, so results of calls started before it are ignored
+        self._generation = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def _retry_after(self) -> float:
+        return max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+
+    def _before_call(self):
+        """
+        Admit a call or raise CircuitOpenError. Returns a (generation, is_probe) token.
+        """
+        if self.state == self.OPEN:
+            if self._retry_after() > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self._retry_after())
+            self.state = self.HALF_OPEN
+
+        is_probe = False
+        if self.state == self.HALF_OPEN:
+            # Only one probe at a time; everyone else keeps failing fast
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probe_in_flight = True
+            is_probe = True
+
+        self.calls += 1
+        return self._generation, is_probe
+
+    def _trip(self, reason: str):
+        self.state = self.OPEN
+        self._opened_at = self._clock()
+        self._generation += 1
+        self.trips += 1
+        print(f"🔴 {self.name} circuit opened: {reason}")
+
+    def _on_success(self, token):
+        generation, is_probe = token
+        if is_probe:
+            self._probe_in_flight = False
+            self._consecutive_failures = 0
+            self.state = self.CLOSED
+            print(f"🟢 {self.name} circuit closed")
+        elif self.state == self.CLOSED and generation == self._generation:
+            self._consecutive_failures = 0
+
+    def _on_failure(self, token):
+        self.failures += 1
+        generation, is_probe = token
+        if is_probe:
+            self._probe_in_flight = False
+            self._trip("probe failed")
+        elif self.state == self.CLOSED and generation == self._generation:
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self._trip(f"{self._consecutive_failures} consecutive failures")
+
+    async def call(self, func, *args, timeout: float = None):
+        """
+        Await func(*args) through the breaker, failing it if it exceeds `timeout` seconds
+        """
+        token = self._before_call()
+        try:
+            if timeout:
+                result = await asyncio.wait_for(func(*args), timeout)
+            else:
+                result = await func(*args)
+        except asyncio.CancelledError:
+            # The caller went away; that says nothing about upstream health
+            if token[1]:
+                self._probe_in_flight = False
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+            if self._is_failure(e):
+                self._on_failure(token)
+            else:
+                # Upstream answered, just not favourably for this request
+                self._on_success(token)
+            raise
+        self._on_success(token)
+        return result
+
+    def snapshot(self) -> dict:
+        if self.state == self.OPEN and self._retry_after() == 0:
+            state = self.HALF_OPEN
+        else:
+            state = self.state
+        return {
+            "state": state,
+            "consecutive_failures": self._consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "trips": self.trips,
+        }
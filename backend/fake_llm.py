@@ -0,0 +1,41 @@
+"""
+Local stand-in for LlmChat, for exercising timeouts and the circuit breaker
+without calling Gemini. Enabled in the server with USE_FAKE_LLM=1.
+
+FAKE_LLM_LATENCY_MS    delay before each reply (default 500)
+FAKE_LLM_ERROR_RATE    probability of raising instead of replying (default 0)
+FAKE_LLM_DRINKS        number of drinks in each reply (default 3)
+"""
+
+import asyncio
+import json
+import os
+import random
+
+class FakeLlmError(Exception):
+    # Looks like an upstream 503 to the circuit breaker
+    status_code = 503
+
+class FakeLlmChat:
+    def __init__(self, api_key=None, session_id=None, system_message=None,
+                 latency_ms: float = None, error_rate: float = None, drinks: int = None):
+        self.session_id = session_id
+        self.latency_ms = float(os.environ.get('FAKE_LLM_LATENCY_MS', '500')) if latency_ms is None else latency_ms
+        self.error_rate = float(os.environ.get('FAKE_LLM_ERROR_RATE', '0')) if error_rate is None else error_rate
+        self.drinks = int(os.environ.get('FAKE_LLM_DRINKS', '3')) if drinks is None else drinks
+        self.model = None
+
+    def with_model(self, provider: str, model: str):
+        self.model = (provider, model)
+        return self
+
+    async def send_message(self, user_message) -> str:
+        await asyncio.sleep(self.latency_ms / 1000)
+        if random.random() < self.error_rate:
+            raise FakeLlmError("Injected upstream failure")
+        return json.dumps({
+            "drinks": [
+                {"name": f"Fake Drink {i + 1}", "description": "", "price": f"${i + 3}.00"}
+                for i in range(self.drinks)
+            ]
+        })
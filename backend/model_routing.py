@@ -0,0 +1,170 @@
+"""
+Model routing for menu analysis.
+
+Menu photos range from a five-item chalkboard to a 200-item wine list. The
+router estimates how much text an image holds from cheap signals (encoded
+size, pixel count and edge density) and picks the cheapest model tier
+expected to handle it within the request's latency budget. Per-tier latency
+and estimated cost are recorded so the thresholds can be tuned.
+"""
+
+import io
+import json
+import os
+import struct
+import threading
+
+from PIL import Image, ImageFilter
+
+# Tiers from cheapest to strongest. `max_complexity` is the highest image
+# complexity (0-1) a tier is first choice for; `expected_latency_ms` and
+# `cost_per_call` are estimates used for budgeting and reporting.
+DEFAULT_MODEL_TIERS = [
+    {"name": "lite", "provider": "gemini", "model": "gemini-2.0-flash-lite",
+     "max_complexity": 0.3, "expected_latency_ms": 3000, "cost_per_call": 0.0002},
+    {"name": "standard", "provider": "gemini", "model": "gemini-2.0-flash",
+     "max_complexity": 0.7, "expected_latency_ms": 5000, "cost_per_call": 0.0004},
+    {"name": "pro", "provider": "gemini", "model": "gemini-2.5-pro",
+     "max_complexity": 1.0, "expected_latency_ms": 20000, "cost_per_call": 0.005},
+]
+
+MODEL_TIERS = json.loads(os.environ['LLM_MODEL_TIERS']) if os.environ.get('LLM_MODEL_TIERS') else DEFAULT_MODEL_TIERS
+LLM_LATENCY_BUDGET_MS = int(os.environ.get('LLM_LATENCY_BUDGET_MS', '30000'))
+# A result with fewer drinks than this (or an unparseable one) is escalated
+ROUTING_MIN_DRINKS = int(os.environ.get('ROUTING_MIN_DRINKS', '1'))
+
+# Signal scales: values at or above these count as maximally complex
+_SIZE_SCALE_BYTES = 2_000_000
+_PIXELS_SCALE = 12_000_000
+_EDGE_DENSITY_SCALE = 0.25
+_EDGE_THRESHOLD = 40
+_THUMBNAIL_SIZE = (256, 256)
+
+def image_dimensions(image_bytes: bytes):
+    """
+    Read (width, height) from a PNG or JPEG header, or None if unknown
+    """
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n" and len(image_bytes) >= 24:
+        return struct.unpack(">II", image_bytes[16:24])
+    if image_bytes[:2] == b"\xff\xd8":
+        i = 2
+        while i + 9 < len(image_bytes):
+            if image_bytes[i] != 0xFF:
+                return None
+            marker = image_bytes[i + 1]
+            length = struct.unpack(">H", image_bytes[i + 2:i + 4])[0]
+            # SOF0-SOF15, excluding DHT, JPG and DAC markers
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", image_bytes[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+    return None
+
+def _edge_density(image_bytes: bytes):
+    # Share of strong edges in a small grayscale thumbnail; text-heavy menus score high
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.draft("L", _THUMBNAIL_SIZE)
+            thumbnail = img.convert("L")
+            thumbnail.thumbnail(_THUMBNAIL_SIZE)
+            edges = thumbnail.filter(ImageFilter.FIND_EDGES)
+            histogram = edges.histogram()
+            total = sum(histogram)
+            return sum(histogram[_EDGE_THRESHOLD:]) / total if total else None
+    except Exception:
+        return None
+
+def estimate_complexity(image_bytes: bytes) -> float:
+    """
+    Estimate image complexity between 0 (sparse) and 1 (dense)
+    """
+    if not image_bytes:
+        return 0.0
+
+    signals = [min(len(image_bytes) / _SIZE_SCALE_BYTES, 1.0)]
+
+    dimensions = image_dimensions(image_bytes)
+    if dimensions:
+        signals.append(min(dimensions[0] * dimensions[1] / _PIXELS_SCALE, 1.0))
+
+    density = _edge_density(image_bytes)
+    if density is not None:
+        # Edge density is the best text-density proxy, so it counts double
+        signals.extend([min(density / _EDGE_DENSITY_SCALE, 1.0)] * 2)
+
+    return sum(signals) / len(signals)
+
+def pick_tier(complexity: float, latency_budget_ms: float) -> dict:
+    """
+    Pick the cheapest tier suited to the complexity that fits the latency budget
+    """
+    preferred = next((t for t in MODEL_TIERS if complexity <= t["max_complexity"]), MODEL_TIERS[-1])
+    if preferred["expected_latency_ms"] <= latency_budget_ms:
+        return preferred
+    # Over budget: use the strongest tier that still fits, or the fastest one
+    fitting = [t for t in MODEL_TIERS if t["expected_latency_ms"] <= latency_budget_ms]
+    if fitting:
+        return fitting[-1]
+    return min(MODEL_TIERS, key=lambda t: t["expected_latency_ms"])
+
+def escalation_tier(tier: dict, remaining_budget_ms: float):
+    """
+    Return the next stronger tier that fits the remaining budget, or None
+    """
+    for candidate in MODEL_TIERS[MODEL_TIERS.index(tier) + 1:]:
+        if candidate["expected_latency_ms"] <= remaining_budget_ms:
+            return candidate
+    return None
+
+def looks_incomplete(analysis_result: dict, parsed_cleanly: bool) -> bool:
+    if not parsed_cleanly or not isinstance(analysis_result, dict):
+        return True
+    drinks = analysis_result.get("drinks", [])
+    return not isinstance(drinks, list) or len(drinks) < ROUTING_MIN_DRINKS
+
+class RoutingStats:
+    """
+    Per-tier call counts, latency and estimated cost
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers = {}
+
+    def record(self, tier: dict, latency_ms: float, ok: bool, escalated: bool, complexity: float):
+        with self._lock:
+            stats = self._tiers.setdefault(tier["name"], {
+                "model": tier["model"],
+                "calls": 0,
+                "failures": 0,
+                "escalations": 0,
+                "total_latency_ms": 0.0,
+                "max_latency_ms": 0.0,
+                "total_complexity": 0.0,
+                "estimated_cost": 0.0,
+            })
+            stats["calls"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["escalations"] += 1 if escalated else 0
+            stats["total_latency_ms"] += latency_ms
+            stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+            stats["total_complexity"] += complexity
+            stats["estimated_cost"] += tier["cost_per_call"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "model": stats["model"],
+                    "calls": stats["calls"],
+                    "failures": stats["failures"],
+                    "escalations": stats["escalations"],
+                    "avg_latency_ms": round(stats["total_latency_ms"] / stats["calls"], 1),
+                    "max_latency_ms": round(stats["max_latency_ms"], 1),
+                    "avg_complexity": round(stats["total_complexity"] / stats["calls"], 3),
+                    "estimated_cost": round(stats["estimated_cost"], 6),
+                }
+                for name, stats in self._tiers.items()
+            }
+
+routing_stats = RoutingStats()
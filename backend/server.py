@@ -1,19 +1,38 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from brotli_asgi import BrotliMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+import orjson
 import os
 from dotenv import load_dotenv
 import json
 import base64
 import random
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from collections import OrderedDict
 import uuid
+import hashlib
+import re
+import binascii
+import time
+from typing import List, Optional
 from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
 import asyncio
 
 load_dotenv()
 
-app = FastAPI()
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from fake_llm import FakeLlmChat
+from model_routing import (
+    LLM_LATENCY_BUDGET_MS, estimate_complexity, pick_tier, escalation_tier, looks_incomplete, routing_stats
+)
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # CORS configuration
 app.add_middleware(
@@ -24,6 +43,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression: brotli when the client accepts it, gzip otherwise.
+# Small payloads are sent as-is since compressing them costs more than it saves.
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '500'))
+
+app.add_middleware(
+    BrotliMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    gzip_fallback=True,
+)
+
 # MongoDB setup
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'test_database')
@@ -32,10 +61,41 @@ DB_NAME = os.environ.get('DB_NAME', 'test_database')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 
+# Gemini call protection: per-call deadline, and a circuit breaker that fails
+# fast after repeated upstream failures
+LLM_CALL_TIMEOUT_SECONDS = float(os.environ.get('LLM_CALL_TIMEOUT_SECONDS', '30'))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('LLM_BREAKER_FAILURE_THRESHOLD', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Swap Gemini for a local fake that injects latency and errors (see fake_llm.py)
+USE_FAKE_LLM = os.environ.get('USE_FAKE_LLM', '').lower() in ('1', 'true', 'yes')
+ChatClass = FakeLlmChat if USE_FAKE_LLM else LlmChat
+
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=LLM_BREAKER_RESET_SECONDS
+)
+
+# HTTP caching for analysis reads. Stored analyses never change, so clients,
+# CDNs and proxies may keep them for as long as they like.
+ANALYSIS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Optional in-process response cache for analysis reads, keyed by request path.
+# Set to the number of responses to keep; 0 disables it.
+ANALYSIS_RESPONSE_CACHE_SIZE = int(os.environ.get('ANALYSIS_RESPONSE_CACHE_SIZE', '0'))
+
+# Batch analysis: concurrent LLM calls and records per insert_many
+BATCH_LLM_CONCURRENCY = int(os.environ.get('BATCH_LLM_CONCURRENCY', '8'))
+BATCH_INSERT_SIZE = int(os.environ.get('BATCH_INSERT_SIZE', '50'))
+
 client = AsyncIOMotorClient(MONGO_URL)
 db = client[DB_NAME]
 menu_collection = db.menu_analyses
 
+# path -> (body, headers), least recently used first
+analysis_response_cache = OrderedDict()
+
 @app.get("/")
 async def root():
     return {"message": "Menu Drink Selector API"}
@@ -44,19 +104,7 @@ async def root():
 async def api_root():
     return {"message": "Menu Drink Selector API"}
 
-@app.post("/api/analyze-menu")
-async def analyze_menu(image_data: str = Form(...)):
-    """
-    Analyze menu image to extract drink options using Google Gemini
-    """
-    try:
-        print(f"📸 Received image data of length: {len(image_data)}")
-        
-        # Create a new chat instance for menu analysis using Google Gemini
-        chat = LlmChat(
-            api_key=GEMINI_API_KEY,
-            session_id=f"menu-analysis-{uuid.uuid4()}",
-            system_message="""You are a menu analysis expert. Your task is to analyze menu images and extract ONLY drink items. 
+MENU_ANALYSIS_SYSTEM_MESSAGE = """You are a menu analysis expert. Your task is to analyze menu images and extract ONLY drink items. 
             
             Rules:
             1. Only identify beverages, drinks, cocktails, juices, sodas, coffee, tea, wine, beer, etc.
@@ -74,71 +122,376 @@ async def analyze_menu(image_data: str = Form(...)):
             4. If no drinks are found, return {"drinks": []}
             5. Be thorough - look for all drink sections including alcoholic and non-alcoholic beverages
             """
-        ).with_model("gemini", "gemini-2.0-flash")
 
-        print("🤖 Created LlmChat instance with Gemini successfully")
+MENU_ANALYSIS_PROMPT = "Analyze this menu image and extract all drink items. Return the response as valid JSON only."
 
-        # Create image content from base64
-        image_base64 = image_data.split(',')[1] if ',' in image_data else image_data
-        image_content = ImageContent(image_base64=image_base64)
+def _image_hash(image_bytes: bytes) -> str:
+    # Hash the decoded bytes so line-wrapped or re-encoded base64 of one image matches
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def _parse_analysis_response(response: str):
+    """
+    Parse the model response into {"drinks": [...]}, tolerating text around the JSON.
+    Returns (analysis_result, parsed) where `parsed` is False if the response held
+    no usable {"drinks": [...]} object.
+    """
+    try:
+        analysis_result = json.loads(response)
+        print("✅ Successfully parsed JSON response")
+    except json.JSONDecodeError as json_err:
+        print(f"⚠️ JSON decode error: {json_err}")
+        # If response is not valid JSON, try to extract JSON from the response
+        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        if not json_match:
+            print("❌ Could not find valid JSON in response")
+            return {"drinks": []}, False
+        try:
+            analysis_result = json.loads(json_match.group())
+        except json.JSONDecodeError as json_err:
+            print(f"❌ Could not parse extracted JSON: {json_err}")
+            return {"drinks": []}, False
+        print("✅ Extracted JSON from response")
 
-        print("🖼️ Created image content successfully")
+    if not isinstance(analysis_result, dict) or not isinstance(analysis_result.get("drinks", []), list):
+        print("❌ Response JSON is not a {\"drinks\": [...]} object")
+        return {"drinks": []}, False
+    return analysis_result, True
 
-        # Analyze the menu image
-        user_message = UserMessage(
-            text="Analyze this menu image and extract all drink items. Return the response as valid JSON only.",
-            file_contents=[image_content]
-        )
+# Leading bytes of the image formats Gemini accepts
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"RIFF")
+
+class InvalidImageError(ValueError):
+    pass
+
+def _check_image_bytes(image_bytes: bytes):
+    if not image_bytes:
+        raise InvalidImageError("Image data is empty")
+    # WebP is RIFF....WEBP; HEIC/HEIF is an ISO box starting with ....ftyp
+    if not (image_bytes.startswith(IMAGE_SIGNATURES) or image_bytes[4:8] == b"ftyp"):
+        raise InvalidImageError("Image data is not a supported image format")
+
+def _decode_image(image_base64: str) -> bytes:
+    """
+    Decode and sanity-check base64 image data, raising InvalidImageError if it is unusable
+    """
+    try:
+        image_bytes = base64.b64decode("".join(image_base64.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImageError("Image data is not valid base64")
+    _check_image_bytes(image_bytes)
+    return image_bytes
+
+async def _analyze_image(image_base64: str, image_bytes: bytes, latency_budget_ms: int = None) -> dict:
+    """
+    Send one menu image to Google Gemini and return the parsed analysis.
+
+    The model tier is picked from the image complexity and latency budget, and
+    escalated to a stronger tier while the result looks incomplete and the
+    remaining budget allows. `image_bytes` must already be validated, so that
+    only upstream problems reach the circuit breaker.
+    """
+    if latency_budget_ms is None:
+        latency_budget_ms = LLM_LATENCY_BUDGET_MS
+    started = time.monotonic()
+
+    loop = asyncio.get_running_loop()
+    complexity = await loop.run_in_executor(None, estimate_complexity, image_bytes)
+    tier = pick_tier(complexity, latency_budget_ms)
+    print(f"🧭 Image complexity {complexity:.2f}, routing to {tier['name']} ({tier['model']})")
+
+    # Analyze the menu image
+    user_message = UserMessage(
+        text=MENU_ANALYSIS_PROMPT,
+        file_contents=[ImageContent(image_base64=image_base64)]
+    )
+
+    previous_result = None
+    while True:
+        # Create a new chat instance for menu analysis using Google Gemini
+        chat = ChatClass(
+            api_key=GEMINI_API_KEY,
+            session_id=f"menu-analysis-{uuid.uuid4()}",
+            system_message=MENU_ANALYSIS_SYSTEM_MESSAGE
+        ).with_model(tier["provider"], tier["model"])
 
         print("💬 Sending message to Google Gemini...")
         
-        # Get analysis from Gemini
-        response = await chat.send_message(user_message)
+        # Get analysis from Gemini. The breaker enforces the upstream deadline;
+        # a shorter remaining budget is enforced outside it, so a tight client
+        # budget never counts as an upstream failure.
+        call_started = time.monotonic()
+        remaining_s = latency_budget_ms / 1000 - (call_started - started)
+        call = gemini_breaker.call(chat.send_message, user_message, timeout=LLM_CALL_TIMEOUT_SECONDS)
+        try:
+            if remaining_s < LLM_CALL_TIMEOUT_SECONDS:
+                response = await asyncio.wait_for(call, max(remaining_s, 0.001))
+            else:
+                response = await call
+        except Exception as e:
+            # Calls rejected by an open circuit never reached upstream
+            if not isinstance(e, CircuitOpenError):
+                routing_stats.record(tier, (time.monotonic() - call_started) * 1000, False, False, complexity)
+            # A failed escalation still leaves the earlier, weaker result
+            if previous_result is not None:
+                print(f"⚠️ Escalation to {tier['name']} failed ({e!r}), keeping earlier result")
+                return previous_result
+            raise
+        call_latency_ms = (time.monotonic() - call_started) * 1000
         
         print(f"✅ Received response from Gemini: {response[:200]}...")
         
-        # Parse the JSON response
+        analysis_result, parsed = _parse_analysis_response(response)
+
+        next_tier = None
+        if looks_incomplete(analysis_result, parsed):
+            remaining_ms = latency_budget_ms - (time.monotonic() - started) * 1000
+            next_tier = escalation_tier(tier, remaining_ms)
+
+        routing_stats.record(tier, call_latency_ms, True, next_tier is not None, complexity)
+
+        if next_tier is None:
+            return analysis_result
+
+        print(f"⬆️ Result looks incomplete, escalating to {next_tier['name']} ({next_tier['model']})")
+        previous_result = analysis_result
+        tier = next_tier
+
+def _build_analysis_record(image_data: str, image_hash: str, analysis_result: dict) -> dict:
+    return {
+        "analysis_id": str(uuid.uuid4()),
+        "drinks": analysis_result.get("drinks", []),
+        "timestamp": datetime.utcnow(),
+        "image_hash": image_hash,
+        "image_data": image_data[:100] + "..." if len(image_data) > 100 else image_data  # Store truncated image data
+    }
+
+@app.on_event("startup")
+async def create_indexes():
+    # Lets batch runs skip images that were already analysed
+    await menu_collection.create_index("image_hash")
+    # Every analysis read, including conditional existence checks, looks up by ID
+    await menu_collection.create_index("analysis_id", unique=True)
+    # Keyset pagination over history, newest first
+    await menu_collection.create_index([("timestamp", -1), ("_id", -1)])
+
+async def _cached_analysis_response(image_hash: str, error: Exception):
+    """
+    Serve the latest stored analysis of the same image while Gemini is unavailable
+    """
+    cached = await menu_collection.find_one({"image_hash": image_hash}, sort=[("timestamp", -1)])
+    if cached:
+        print(f"♻️ Gemini unavailable ({error!r}), serving cached analysis {cached['analysis_id']}")
+        return {
+            "analysis_id": cached["analysis_id"],
+            "drinks": cached["drinks"],
+            "total_drinks": len(cached["drinks"]),
+            "cached": True
+        }
+
+    if isinstance(error, CircuitOpenError):
+        raise HTTPException(
+            status_code=503,
+            detail="Menu analysis is temporarily unavailable, please try again shortly",
+            headers={"Retry-After": str(max(int(error.retry_after), 1))}
+        )
+    raise HTTPException(status_code=504, detail="Menu analysis timed out")
+
+@app.post("/api/analyze-menu")
+async def analyze_menu(image_data: str = Form(...), latency_budget_ms: Optional[int] = Form(None, gt=0)):
+    """
+    Analyze menu image to extract drink options using Google Gemini
+    """
+    try:
+        print(f"📸 Received image data of length: {len(image_data)}")
+
+        # Create image content from base64
+        image_base64 = image_data.split(',')[1] if ',' in image_data else image_data
+
         try:
-            analysis_result = json.loads(response)
-            print("✅ Successfully parsed JSON response")
-        except json.JSONDecodeError as json_err:
-            print(f"⚠️ JSON decode error: {json_err}")
-            # If response is not valid JSON, try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                analysis_result = json.loads(json_match.group())
-                print("✅ Extracted JSON from response")
-            else:
-                print("❌ Could not find valid JSON in response")
-                analysis_result = {"drinks": []}
+            image_bytes = _decode_image(image_base64)
+        except InvalidImageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        image_hash = _image_hash(image_bytes)
 
-        # Generate analysis ID
-        analysis_id = str(uuid.uuid4())
+        try:
+            analysis_result = await _analyze_image(image_base64, image_bytes, latency_budget_ms)
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            return await _cached_analysis_response(image_hash, e)
         
         # Store analysis in database
-        analysis_record = {
-            "analysis_id": analysis_id,
-            "drinks": analysis_result.get("drinks", []),
-            "timestamp": datetime.utcnow(),
-            "image_data": image_data[:100] + "..." if len(image_data) > 100 else image_data  # Store truncated image data
-        }
+        analysis_record = _build_analysis_record(image_data, image_hash, analysis_result)
+        analysis_id = analysis_record["analysis_id"]
         
         await menu_collection.insert_one(analysis_record)
         print(f"💾 Stored analysis in database with ID: {analysis_id}")
         
         return {
             "analysis_id": analysis_id,
-            "drinks": analysis_result.get("drinks", []),
-            "total_drinks": len(analysis_result.get("drinks", []))
+            "drinks": analysis_record["drinks"],
+            "total_drinks": len(analysis_record["drinks"])
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error analyzing menu: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error analyzing menu: {str(e)}")
 
+async def analyze_menu_batch(items, concurrency: int = BATCH_LLM_CONCURRENCY, skip_hashes=None, on_stored=None) -> dict:
+    """
+    Analyze many menu images through a bounded-concurrency pipeline.
+
+    `items` is a list of (name, content_type, load) tuples where `load` is an
+    async callable returning the raw image bytes. Already stored images are
+    skipped and reported with their existing analysis_id; repeats within the
+    batch are analysed once and reported with the first copy's analysis_id.
+    Images whose hash is only in `skip_hashes` (e.g. a checkpoint) are skipped
+    without an analysis_id. Records are written with insert_many in chunks of
+    BATCH_INSERT_SIZE, and `on_stored` is called with the hashes of the
+    records each chunk actually persisted.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Batch concurrency must be at least 1, got {concurrency}")
+
+    skip_hashes = set(skip_hashes or ())
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(items)
+    pending_records = []
+    report = []
+    # image_hash -> result of the first copy in this batch
+    first_results = {}
+    duplicates = []
+    progress = {"done": 0}
+
+    def print_progress(result):
+        progress["done"] += 1
+        prefix = f"[{progress['done']}/{total}] {result['filename']}"
+        if result["status"] == "failed":
+            print(f"❌ {prefix}: {result['error']}")
+        else:
+            print(f"✅ {prefix}: {result['status']}")
+
+    async def flush():
+        if not pending_records:
+            return
+        pending = pending_records[:]
+        pending_records.clear()
+        records = [record for _, record in pending]
+        failed = {}
+        try:
+            await menu_collection.insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts store everything except the listed documents
+            failed = {error["index"]: error.get("errmsg", "write error") for error in e.details.get("writeErrors", [])}
+            print(f"❌ Error storing {len(failed)} of {len(records)} analyses: {str(e)}")
+        except Exception as e:
+            failed = {index: str(e) for index in range(len(records))}
+            print(f"❌ Error storing {len(records)} analyses: {str(e)}")
+
+        for index, message in failed.items():
+            result = pending[index][0]
+            result.update({"status": "failed", "error": f"Error storing analysis: {message}"})
+            result.pop("analysis_id", None)
+            result.pop("total_drinks", None)
+
+        # Analysed items are only reported once we know whether they were stored
+        for result, _ in pending:
+            print_progress(result)
+
+        stored = [record["image_hash"] for index, record in enumerate(records) if index not in failed]
+        if stored:
+            print(f"💾 Stored {len(stored)} analyses")
+            if on_stored:
+                on_stored(stored)
+
+    async def process(name, content_type, load):
+        result = {"filename": name, "status": "failed"}
+        try:
+            # Decode and preprocess: only `concurrency` images are held in memory at once
+            async with semaphore:
+                image_bytes = await load()
+                _check_image_bytes(image_bytes)
+                image_hash = _image_hash(image_bytes)
+                result["image_hash"] = image_hash
+
+                existing = await menu_collection.find_one({"image_hash": image_hash}, {"_id": 0, "analysis_id": 1})
+                if existing:
+                    result.update({"status": "skipped", "analysis_id": existing["analysis_id"]})
+                    return result, None
+                if image_hash in skip_hashes:
+                    result["status"] = "skipped"
+                    return result, None
+                # Duplicate images within the same batch are only analysed once
+                if image_hash in first_results:
+                    result.update({"status": "skipped", "duplicate_of": first_results[image_hash]["filename"]})
+                    return result, None
+                first_results[image_hash] = result
+
+                image_base64 = base64.b64encode(image_bytes).decode()
+                analysis_result = await _analyze_image(image_base64, image_bytes)
+
+            image_data = f"data:{content_type or 'image/jpeg'};base64,{image_base64}"
+            record = _build_analysis_record(image_data, image_hash, analysis_result)
+            result.update({
+                "status": "analyzed",
+                "analysis_id": record["analysis_id"],
+                "total_drinks": len(record["drinks"])
+            })
+            return result, record
+        except Exception as e:
+            result["error"] = str(e)
+            return result, None
+
+    tasks = [asyncio.ensure_future(process(*item)) for item in items]
+    try:
+        for task in asyncio.as_completed(tasks):
+            result, record = await task
+            report.append(result)
+            if record is not None:
+                pending_records.append((result, record))
+                if len(pending_records) >= BATCH_INSERT_SIZE:
+                    await flush()
+            elif "duplicate_of" in result:
+                # Reported once the first copy's outcome is known
+                duplicates.append(result)
+            else:
+                print_progress(result)
+        await flush()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for result in duplicates:
+        first = first_results[result["image_hash"]]
+        if first["status"] == "analyzed":
+            result["analysis_id"] = first["analysis_id"]
+        else:
+            result.update({"status": "failed", "error": f"Duplicate of {first['filename']}, which failed"})
+        print_progress(result)
+
+    return {
+        "total": total,
+        "analyzed": sum(1 for r in report if r["status"] == "analyzed"),
+        "skipped": sum(1 for r in report if r["status"] == "skipped"),
+        "failed": sum(1 for r in report if r["status"] == "failed"),
+        "results": report
+    }
+
+@app.post("/api/analyze-menu/batch")
+async def analyze_menu_batch_upload(files: List[UploadFile] = File(...)):
+    """
+    Analyze several uploaded menu images in one request
+    """
+    try:
+        print(f"📦 Received batch of {len(files)} images")
+        items = [(upload.filename, upload.content_type, upload.read) for upload in files]
+        return await analyze_menu_batch(items)
+    except Exception as e:
+        print(f"❌ Error analyzing menu batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error analyzing menu batch: {str(e)}")
+
 @app.post("/api/random-drink")
 async def get_random_drink(analysis_id: str = Form(...)):
     """
@@ -169,23 +522,208 @@ async def get_random_drink(analysis_id: str = Form(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error selecting random drink: {str(e)}")
 
+# History listings leave out the drinks list and image data
+HISTORY_PROJECTION = {
+    "_id": 1,
+    "analysis_id": 1,
+    "timestamp": 1,
+    "total_drinks": {"$size": {"$ifNull": ["$drinks", []]}},
+}
+HISTORY_SORT = [("timestamp", -1), ("_id", -1)]
+HISTORY_EXPORT_BATCH_SIZE = 1000
+
+def _encode_history_cursor(analysis: dict) -> str:
+    payload = orjson.dumps({"t": analysis["timestamp"].isoformat(), "id": str(analysis["_id"])})
+    return base64.urlsafe_b64encode(payload).decode()
+
+def _history_query(cursor: str) -> dict:
+    """
+    Build the keyset filter for documents after `cursor` in HISTORY_SORT order
+    """
+    if not cursor:
+        return {}
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp = datetime.fromisoformat(payload["t"])
+        last_id = ObjectId(payload["id"])
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {
+        "$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}},
+        ]
+    }
+
+def _history_item(analysis: dict) -> dict:
+    return {
+        "analysis_id": analysis["analysis_id"],
+        "total_drinks": analysis["total_drinks"],
+        "timestamp": analysis["timestamp"]
+    }
+
+@app.get("/api/analyses")
+async def list_analyses(limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
+    """
+    List past analyses, newest first. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    query = _history_query(cursor)
+    try:
+        # One extra document tells us whether there is another page
+        analyses = await menu_collection.find(query, HISTORY_PROJECTION).sort(HISTORY_SORT).limit(limit + 1).to_list(limit + 1)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing analyses: {str(e)}")
+
+    page = analyses[:limit]
+    return {
+        "analyses": [_history_item(analysis) for analysis in page],
+        "next_cursor": _encode_history_cursor(page[-1]) if len(analyses) > limit else None
+    }
+
+@app.get("/api/analyses/export")
+async def export_analyses(cursor: Optional[str] = None):
+    """
+    Stream past analyses as NDJSON, newest first
+    """
+    query = _history_query(cursor)
+
+    async def generate():
+        documents = menu_collection.find(query, HISTORY_PROJECTION).sort(HISTORY_SORT).batch_size(HISTORY_EXPORT_BATCH_SIZE)
+        async for analysis in documents:
+            yield orjson.dumps(_history_item(analysis)) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/api/routing/stats")
+async def get_routing_stats():
+    """
+    Per-tier LLM call counts, latency and estimated cost
+    """
+    return {"tiers": routing_stats.snapshot()}
+
+@app.get("/api/circuit-breaker/stats")
+async def get_circuit_breaker_stats():
+    """
+    Gemini circuit breaker state and trip counts
+    """
+    return {"gemini": gemini_breaker.snapshot()}
+
+def _analysis_etag(analysis_id: str) -> str:
+    # Analyses are immutable once stored, so the ID alone identifies the content.
+    # Weak, because identity, gzip and br encodings all share it.
+    return f'W/"{analysis_id}"'
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag (weak comparison).
+    `*` is not handled here since it only matches an existing analysis.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(_opaque_tag(tag) == _opaque_tag(etag) for tag in candidates)
+
+def _http_date(timestamp: datetime) -> str:
+    # Stored timestamps are naive UTC
+    return format_datetime(timestamp.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def _not_modified_since(if_modified_since: str, last_modified: str) -> bool:
+    """
+    Check an If-Modified-Since header value against a Last-Modified date
+    """
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        # Unparseable dates are ignored, as RFC 9110 requires
+        return False
+
+def _is_not_modified(request: Request, etag: str, last_modified: str = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    # If-None-Match takes precedence; If-Modified-Since is only consulted without it
+    if if_none_match:
+        # Only called once the analysis is known to exist, so `*` matches
+        return if_none_match.strip() == "*" or _etag_matches(if_none_match, etag)
+    if last_modified:
+        return _not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    return False
+
+def _cache_analysis_response(path: str, body: bytes, headers: dict):
+    if ANALYSIS_RESPONSE_CACHE_SIZE <= 0:
+        return
+    analysis_response_cache[path] = (body, headers)
+    analysis_response_cache.move_to_end(path)
+    while len(analysis_response_cache) > ANALYSIS_RESPONSE_CACHE_SIZE:
+        analysis_response_cache.popitem(last=False)
+
 @app.get("/api/analysis/{analysis_id}")
-async def get_analysis(analysis_id: str):
+async def get_analysis(analysis_id: str, request: Request):
     """
     Get analysis details by ID
     """
+    etag = _analysis_etag(analysis_id)
+    path = request.url.path
+
+    # Repeat fetches only need an existence check, not the whole document
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        try:
+            exists = path in analysis_response_cache or await menu_collection.find_one(
+                {"analysis_id": analysis_id}, {"_id": 1}
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error retrieving analysis: {str(e)}")
+        if not exists:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+        return Response(
+            status_code=304,
+            headers={"ETag": etag, "Cache-Control": ANALYSIS_CACHE_CONTROL}
+        )
+
+    cached = analysis_response_cache.get(path)
+    if cached is not None:
+        analysis_response_cache.move_to_end(path)
+        body, headers = cached
+        if _is_not_modified(request, etag, headers["Last-Modified"]):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={**headers, "X-Cache": "HIT"}
+        )
+
     try:
         analysis = await menu_collection.find_one({"analysis_id": analysis_id})
         
         if not analysis:
             raise HTTPException(status_code=404, detail="Analysis not found")
         
-        return {
-            "analysis_id": analysis["analysis_id"],
-            "drinks": analysis["drinks"],
-            "total_drinks": len(analysis["drinks"]),
-            "timestamp": analysis["timestamp"]
+        headers = {
+            "ETag": etag,
+            "Last-Modified": _http_date(analysis["timestamp"]),
+            "Cache-Control": ANALYSIS_CACHE_CONTROL,
         }
+
+        if _is_not_modified(request, etag, headers["Last-Modified"]):
+            return Response(status_code=304, headers=headers)
+
+        response = ORJSONResponse(
+            {
+                "analysis_id": analysis["analysis_id"],
+                "drinks": analysis["drinks"],
+                "total_drinks": len(analysis["drinks"]),
+                "timestamp": analysis["timestamp"]
+            },
+            headers=headers
+        )
+        _cache_analysis_response(path, response.body, headers)
+
+        if ANALYSIS_RESPONSE_CACHE_SIZE > 0:
+            response.headers["X-Cache"] = "MISS"
+        return response
         
     except HTTPException:
         raise
@@ -122,6 +122,38 @@ def test_analyze_menu_invalid_data():
         print(f"❌ Invalid data test error: {e}")
         return False
 
+def test_analyze_menu_batch_endpoint():
+    """Test POST /api/analyze-menu/batch endpoint"""
+    print("\n=== Testing Analyze Menu Batch Endpoint ===")
+    try:
+        image_bytes = base64.b64decode(create_test_image_base64().split(',')[1])
+        files = [
+            ('files', ('menu1.png', image_bytes, 'image/png')),
+            ('files', ('menu2.png', image_bytes, 'image/png')),
+        ]
+        response = requests.post(f"{BASE_URL}/api/analyze-menu/batch", files=files)
+        
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {response.json()}")
+        
+        if response.status_code == 200:
+            result = response.json()
+            required_fields = ['total', 'analyzed', 'skipped', 'failed', 'results']
+            
+            if all(field in result for field in required_fields) and len(result['results']) == 2:
+                print("✅ Analyze menu batch endpoint working")
+                return True
+            else:
+                print(f"❌ Missing required fields in response: {required_fields}")
+                return False
+        else:
+            print("❌ Analyze menu batch endpoint failed")
+            return False
+            
+    except Exception as e:
+        print(f"❌ Analyze menu batch endpoint error: {e}")
+        return False
+
 def test_random_drink_endpoint(analysis_id):
     """Test POST /api/random-drink endpoint"""
     print("\n=== Testing Random Drink Endpoint ===")
@@ -201,6 +233,41 @@ def test_get_analysis_endpoint(analysis_id):
         print(f"❌ Get analysis endpoint error: {e}")
         return False
 
+def test_get_analysis_not_modified(analysis_id):
+    """Test conditional GET /api/analysis/{analysis_id} with If-None-Match"""
+    print("\n=== Testing Get Analysis Conditional Request ===")
+    try:
+        response = requests.get(f"{BASE_URL}/api/analysis/{analysis_id}")
+        etag = response.headers.get('etag')
+        cache_control = response.headers.get('cache-control', '')
+        print(f"ETag: {etag}")
+        print(f"Cache-Control: {cache_control}")
+        
+        if not etag:
+            print("❌ ETag header missing")
+            return False
+        
+        if 'immutable' not in cache_control:
+            print("❌ Cache-Control should mark analyses as immutable")
+            return False
+        
+        response = requests.get(
+            f"{BASE_URL}/api/analysis/{analysis_id}",
+            headers={'If-None-Match': etag}
+        )
+        print(f"Status Code: {response.status_code}")
+        
+        if response.status_code == 304 and not response.content:
+            print("✅ Conditional request returned 304 Not Modified")
+            return True
+        else:
+            print("❌ Should have returned 304 for matching ETag")
+            return False
+            
+    except Exception as e:
+        print(f"❌ Conditional request test error: {e}")
+        return False
+
 def test_get_analysis_invalid_id():
     """Test get analysis with invalid ID"""
     print("\n=== Testing Get Analysis with Invalid ID ===")
@@ -221,6 +288,41 @@ def test_get_analysis_invalid_id():
         print(f"❌ Invalid ID test error: {e}")
         return False
 
+def test_list_analyses_endpoint():
+    """Test GET /api/analyses pagination"""
+    print("\n=== Testing List Analyses Endpoint ===")
+    try:
+        response = requests.get(f"{BASE_URL}/api/analyses", params={'limit': 1})
+        
+        print(f"Status Code: {response.status_code}")
+        print(f"Response: {response.json()}")
+        
+        if response.status_code != 200:
+            print("❌ List analyses endpoint failed")
+            return False
+        
+        result = response.json()
+        if 'analyses' not in result or 'next_cursor' not in result or len(result['analyses']) > 1:
+            print("❌ Unexpected list analyses response")
+            return False
+        
+        if result['next_cursor']:
+            next_page = requests.get(
+                f"{BASE_URL}/api/analyses",
+                params={'limit': 1, 'cursor': result['next_cursor']}
+            ).json()
+            first_ids = {a['analysis_id'] for a in result['analyses']}
+            if any(a['analysis_id'] in first_ids for a in next_page['analyses']):
+                print("❌ Next page repeated an analysis")
+                return False
+        
+        print("✅ List analyses endpoint working")
+        return True
+            
+    except Exception as e:
+        print(f"❌ List analyses endpoint error: {e}")
+        return False
+
 def test_cors_headers():
     """Test CORS headers on all endpoints"""
     print("\n=== Testing CORS Headers ===")
@@ -266,20 +368,28 @@ def main():
     # Test 3: Analyze menu with invalid data
     results.append(("Analyze Menu (Invalid Data)", test_analyze_menu_invalid_data()))
     
+    # Test 3b: Batch analysis endpoint
+    results.append(("Analyze Menu (Batch)", test_analyze_menu_batch_endpoint()))
+    
     # Test 4: Random drink endpoint (only if we have analysis_id)
     if analysis_id:
         results.append(("Random Drink", test_random_drink_endpoint(analysis_id)))
         results.append(("Get Analysis", test_get_analysis_endpoint(analysis_id)))
+        results.append(("Get Analysis (ETag)", test_get_analysis_not_modified(analysis_id)))
     else:
         print("⚠️ Skipping random drink and get analysis tests - no analysis_id available")
         results.append(("Random Drink", False))
         results.append(("Get Analysis", False))
+        results.append(("Get Analysis (ETag)", False))
     
     # Test 5: Error handling tests
     results.append(("Random Drink (Invalid ID)", test_random_drink_invalid_id()))
     results.append(("Get Analysis (Invalid ID)", test_get_analysis_invalid_id()))
     
-    # Test 6: CORS headers
+    # Test 6: History listing
+    results.append(("List Analyses", test_list_analyses_endpoint()))
+    
+    # Test 7: CORS headers
     results.append(("CORS Headers", test_cors_headers()))
     
     # Summary